@@ -9,6 +9,15 @@ from nn_closed_loop.utils.utils import (
 )
 import os
 import argparse
+import ast
+import time
+
+dir_path = os.path.dirname(os.path.abspath(__file__))
+
+# Hyperparameters embedded in the plot filename, in order
+# (num_partitions is left out of the closed-loop filenames)
+_PART_KEYS = ()
+_PROP_KEYS = ("cvxpy_solver",)
 
 
 def main(args):
@@ -32,8 +41,6 @@ def main(args):
                 ]
             )
         else:
-            import ast
-
             init_state_range = np.array(
                 ast.literal_eval(args.init_state_range)
             )
@@ -50,8 +57,6 @@ def main(args):
                 ]
             ).T
         else:
-            import ast
-
             init_state_range = np.array(
                 ast.literal_eval(args.init_state_range)
             )
@@ -61,8 +66,6 @@ def main(args):
     if args.num_partitions is None:
         num_partitions = np.array([4, 4])
     else:
-        import ast
-
         num_partitions = np.array(
             ast.literal_eval(args.num_partitions)
         )
@@ -106,8 +109,6 @@ def main(args):
 
     # Run the analyzer N times to compute an estimated runtime
     if args.estimate_runtime:
-        import time
-
         num_calls = 5
         times = np.empty(num_calls)
         for num in range(num_calls):
@@ -131,58 +132,28 @@ def main(args):
     # print('Final step approximation error:{:.2f}\nAverage approximation error: {:.2f}'.format(error, avg_error))
 
     if args.save_plot:
-        save_dir = "{}/results/examples/".format(
-            os.path.dirname(os.path.abspath(__file__))
-        )
+        save_dir = "{}/results/examples/".format(dir_path)
         os.makedirs(save_dir, exist_ok=True)
 
         # Ugly logic to embed parameters in filename:
         pars = "_".join(
-            [
-                str(key) + "_" + str(value)
-                for key, value in sorted(
-                    partitioner_hyperparams.items(), key=lambda kv: kv[0]
-                )
-                if key
-                not in [
-                    "make_animation",
-                    "show_animation",
-                    "type",
-                    "num_partitions",
-                ]
-            ]
+            f"{key}_{partitioner_hyperparams[key]}"
+            for key in _PART_KEYS
+            if key in partitioner_hyperparams
         )
         pars2 = "_".join(
-            [
-                str(key) + "_" + str(value)
-                for key, value in sorted(
-                    propagator_hyperparams.items(), key=lambda kv: kv[0]
-                )
-                if key not in ["input_shape", "type"]
-            ]
+            f"{key}_{propagator_hyperparams[key]}"
+            for key in _PROP_KEYS
+            if key in propagator_hyperparams
         )
+        pars2 = "_" + pars2 if pars2 else ""
         analyzer_info["save_name"] = (
-            save_dir
-            + args.system
-            + pars
-            + "_"
-            + partitioner_hyperparams["type"]
-            + "_"
-            + propagator_hyperparams["type"]
-            + "_"
-            + "tmax"
-            + "_"
-            + str(round(args.t_max, 1))
-            + "_"
-            + args.boundaries
-            + "_"
-            + str(args.num_polytope_facets)
+            f"{save_dir}{args.system}{pars}_"
+            f"{partitioner_hyperparams['type']}_"
+            f"{propagator_hyperparams['type']}_"
+            f"tmax_{round(args.t_max, 1)}_"
+            f"{args.boundaries}_{args.num_polytope_facets}{pars2}.png"
         )
-        if len(pars2) > 0:
-            analyzer_info["save_name"] = (
-                analyzer_info["save_name"] + "_" + pars2
-            )
-        analyzer_info["save_name"] = analyzer_info["save_name"] + ".png"
 
     if args.show_plot or args.save_plot:
         analyzer.visualize(
@@ -2,6 +2,7 @@ from .Dynamics import Dynamics
 import numpy as np
 from scipy.linalg import solve_discrete_are
 from nn_closed_loop.utils.mpc import control_mpc
+from ._kernels import affine_step
 
 
 class DoubleIntegrator(Dynamics):
@@ -45,7 +46,7 @@ class DoubleIntegrator(Dynamics):
 
     def dynamics_step(self, xs, us):
         # Dynamics are already discretized:
-        xs_t1 = (np.dot(self.At, xs.T) + np.dot(self.bt, us.T)).T + self.ct
+        xs_t1 = affine_step(xs, us, self.At, self.bt, self.ct)
         if self.process_noise is not None:
             noise = np.random.uniform(
                 low=self.process_noise[:, 0],
@@ -6,11 +6,17 @@ from nn_closed_loop.utils.nn_bounds import BoundClosedLoopController
 import nn_closed_loop.constraints as constraints
 import torch
 import os
-import pickle
+import functools
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
 
+@functools.lru_cache(maxsize=8)
+def _colors_cached(cmap_name, t_max):
+    cmap = cm.get_cmap(cmap_name)
+    return tuple(cmap(i) for i in range(t_max + 1))
+
+
 class Dynamics:
     def __init__(
         self,
@@ -24,17 +30,17 @@ class Dynamics:
         process_noise=None,
     ):
 
-        # State dynamics
-        self.At = At
-        self.bt = bt
-        self.ct = ct
+        # State dynamics (stored as float64 once, so per-step kernels
+        # don't have to cast them)
+        self.At = np.asarray(At, dtype=np.float64)
+        self.bt = np.asarray(bt, dtype=np.float64)
+        self.ct = np.asarray(ct, dtype=np.float64)
         self.num_states, self.num_inputs = bt.shape
 
         # Observation Dynamics and Noise
         if c is None:
             c = np.eye(self.num_states)
         self.c = c
-        self.num_outputs = self.c.shape[0]
         self.sensor_noise = sensor_noise
         self.process_noise = process_noise
 
@@ -43,16 +49,37 @@ class Dynamics:
 
         self.dt = dt
 
+    @property
+    def c(self):
+        return self._c
+
+    @c.setter
+    def c(self, c):
+        # Keep the values derived from c in sync, including when a subclass
+        # assigns self.c after calling Dynamics.__init__
+        self._c = c
+        self.num_outputs = c.shape[0]
+        self._c_is_identity = np.array_equal(c, np.eye(self.num_states))
+        # Contiguous transpose for right-multiplying batches of states
+        self._cT = np.ascontiguousarray(c.T)
+
     def control_nn(self, x, model):
         if x.ndim == 1:
             batch_x = np.expand_dims(x, axis=0)
         else:
             batch_x = x
-        us = model.forward(torch.Tensor(batch_x)).data.numpy()
+        with torch.no_grad():
+            us = model.forward(
+                torch.from_numpy(
+                    np.ascontiguousarray(batch_x, dtype=np.float32)
+                )
+            ).numpy()
         return us
 
     def observe_step(self, xs):
-        obs = np.dot(xs, self.c.T)
+        if self._c_is_identity and self.sensor_noise is None:
+            return xs.copy()
+        obs = np.dot(xs, self._cT)
         if self.sensor_noise is not None:
             noise = np.random.uniform(
                 low=self.sensor_noise[:, 0],
@@ -62,11 +89,21 @@ class Dynamics:
             obs += noise
         return obs
 
+    def _observe_step_into(self, xs, noise, out):
+        if self._c_is_identity:
+            if noise is None:
+                return xs
+            return np.add(xs, noise, out=out)
+        np.dot(xs, self._cT, out=out)
+        if noise is not None:
+            out += noise
+        return out
+
     def dynamics_step(self, xs, us):
         raise NotImplementedError
 
     def colors(self, t_max):
-        return [cm.get_cmap(self.cmap_name)(i) for i in range(t_max + 1)]
+        return _colors_cached(self.cmap_name, t_max)
 
     def get_sampled_output_range(
         self, input_constraint, t_max=5, num_samples=1000, controller="mpc"
@@ -85,10 +122,10 @@ class Dynamics:
         if isinstance(input_constraint, constraints.PolytopeInputConstraint):
             raise NotImplementedError
         elif isinstance(input_constraint, constraints.LpInputConstraint):
-            sampled_range = np.zeros((num_timesteps - 1, num_states, 2))
-            for t in range(1, num_timesteps):
-                sampled_range[t - 1, :, 0] = np.min(xs[:, t, :], axis=0)
-                sampled_range[t - 1, :, 1] = np.max(xs[:, t, :], axis=0)
+            sampled_range = np.stack(
+                [xs[:, 1:, :].min(axis=0), xs[:, 1:, :].max(axis=0)],
+                axis=-1,
+            )
         else:
             raise NotImplementedError
 
@@ -118,13 +155,14 @@ class Dynamics:
         num_runs, num_timesteps, num_states = xs.shape
         colors = self.colors(num_timesteps)
 
-        for t in range(num_timesteps):
-            ax.scatter(
-                xs[:, t, input_dims[0]],
-                xs[:, t, input_dims[1]],
-                color=colors[t],
-                s=4,
-            )
+        # Single scatter call, ordered by timestep so later states are
+        # still drawn on top of earlier ones
+        ax.scatter(
+            xs[:, :, input_dims[0]].swapaxes(0, 1).reshape(-1),
+            xs[:, :, input_dims[1]].swapaxes(0, 1).reshape(-1),
+            c=np.repeat(np.array(colors[:num_timesteps]), num_runs, axis=0),
+            s=4,
+        )
 
         # if isinstance(input_constraint, PolytopeInputConstraint):
 
@@ -166,6 +204,33 @@ class Dynamics:
         )
         return xs, us
 
+    def _sample_initial_states(self, input_constraint, num_runs, rng):
+        if isinstance(input_constraint, constraints.LpInputConstraint):
+            if input_constraint.p == np.inf:
+                xs0 = rng.uniform(
+                    low=input_constraint.range[:, 0],
+                    high=input_constraint.range[:, 1],
+                    size=(num_runs, self.num_states),
+                )
+            else:
+                raise NotImplementedError
+        elif isinstance(input_constraint, constraints.PolytopeInputConstraint):
+            init_state_range = input_constraint.to_linf()
+            xs0 = rng.uniform(
+                low=init_state_range[:, 0],
+                high=init_state_range[:, 1],
+                size=(num_runs, self.num_states),
+            )
+            # Reject samples outside the polytope before run() allocates the
+            # trajectory buffers. Ax is (num_runs, num_facets), so the
+            # membership reduction runs along the contiguous last axis
+            Ax = np.einsum("ij,rj->ri", input_constraint.A, xs0)
+            within_constraint = (Ax <= input_constraint.b).all(axis=1)
+            xs0 = xs0[within_constraint]
+        else:
+            raise NotImplementedError
+        return xs0
+
     def run(
         self,
         t_max,
@@ -183,55 +248,60 @@ class Dynamics:
         if collect_data:
             np.random.seed(1)
             num_runs = int(num_samples / num_timesteps)
-            xs = np.zeros((num_runs, num_timesteps, self.num_states))
-            us = np.zeros((num_runs, num_timesteps, self.num_inputs))
-        # Initial state
-        if isinstance(input_constraint, constraints.LpInputConstraint):
-            if input_constraint.p == np.inf:
-                xs[:, 0, :] = np.random.uniform(
-                    low=input_constraint.range[:, 0],
-                    high=input_constraint.range[:, 1],
-                    size=(num_runs, self.num_states),
-                )
-            else:
-                raise NotImplementedError
-        elif isinstance(input_constraint, constraints.PolytopeInputConstraint):
-            init_state_range = input_constraint.to_linf()
-            xs[:, 0, :] = np.random.uniform(
-                low=init_state_range[:, 0],
-                high=init_state_range[:, 1],
-                size=(num_runs, self.num_states),
+        # Initial states and sensor noise come from a PCG64 generator seeded
+        # like the legacy global state, so each call stays reproducible
+        # (process noise inside dynamics_step still uses np.random)
+        rng = np.random.default_rng(1 if collect_data else 0)
+
+        xs0 = self._sample_initial_states(input_constraint, num_runs, rng)
+        num_runs = xs0.shape[0]
+
+        # Every entry is written below except the final control, which no
+        # step computes and which is zeroed explicitly
+        xs = np.empty((num_runs, num_timesteps, self.num_states))
+        us = np.empty((num_runs, num_timesteps, self.num_inputs))
+        xs[:, 0, :] = xs0
+        us[:, -1, :] = 0.0
+
+        # Sensor noise for the whole rollout is drawn at once, and each
+        # step's observation is written into the same buffer
+        if self.sensor_noise is None:
+            noise = None
+        else:
+            noise = rng.uniform(
+                low=self.sensor_noise[:, 0],
+                high=self.sensor_noise[:, 1],
+                size=(num_runs, num_timesteps, self.num_outputs),
             )
-            within_constraint_inds = np.where(
-                np.all(
-                    (
-                        np.dot(input_constraint.A, xs[:, 0, :].T)
-                        - np.expand_dims(input_constraint.b, axis=-1)
-                    )
-                    <= 0,
-                    axis=0,
-                )
+        obs_buf = np.empty((num_runs, self.num_outputs))
+
+        # NN controllers are evaluated in inference mode on a persistent
+        # float32 buffer, so torch can wrap it without a copy each step
+        nn_controller = isinstance(
+            controller, BoundClosedLoopController
+        ) or isinstance(controller, torch.nn.Sequential)
+        if nn_controller:
+            controller.eval()
+            nn_input_buf = np.empty(
+                (num_runs, self.num_outputs), dtype=np.float32
             )
-            xs = xs[within_constraint_inds]
-            us = us[within_constraint_inds]
-        else:
-            raise NotImplementedError
 
-        t = 0
-        step = 0
-        while t < t_max:
+        for step in range(num_timesteps - 1):
 
             # Observe system (using observer matrix,
             # possibly adding measurement noise)
-            obs = self.observe_step(xs[:, step, :])
+            obs = self._observe_step_into(
+                xs[:, step, :],
+                None if noise is None else noise[:, step, :],
+                obs_buf,
+            )
 
             # Compute Control
             if controller == "mpc":
                 u = self.control_mpc(x0=obs)
-            elif isinstance(
-                controller, BoundClosedLoopController
-            ) or isinstance(controller, torch.nn.Sequential):
-                u = self.control_nn(x=obs, model=controller)
+            elif nn_controller:
+                nn_input_buf[:] = obs
+                u = self.control_nn(x=nn_input_buf, model=controller)
             else:
                 raise NotImplementedError
             if clip_control and (self.u_limits is not None):
@@ -241,8 +311,6 @@ class Dynamics:
             xs[:, step + 1, :] = self.dynamics_step(xs[:, step, :], u)
 
             us[:, step, :] = u
-            step += 1
-            t += self.dt + np.finfo(float).eps
 
         if merge_cols:
             return xs.reshape(-1, self.num_states), us.reshape(
@@ -253,6 +321,7 @@ class Dynamics:
 
 
 if __name__ == "__main__":
+    from nn_closed_loop.dynamics import DoubleIntegrator
 
     dynamics = DoubleIntegrator()
     init_state_range = np.array(
@@ -269,10 +338,13 @@ if __name__ == "__main__":
         num_samples=2420,
     )
     print(xs.shape, us.shape)
-    with open(dir_path + "/datasets/double_integrator/xs.pkl", "wb") as f:
-        pickle.dump(xs, f)
-    with open(dir_path + "/datasets/double_integrator/us.pkl", "wb") as f:
-        pickle.dump(us, f)
+    np.savez_compressed(
+        os.path.join(
+            dir_path, "..", "..", "datasets", "double_integrator", "data.npz"
+        ),
+        xs=xs,
+        us=us,
+    )
 
     # from nn_closed_loop.utils.nn import load_model
 
@@ -1,4 +1,5 @@
 from .Dynamics import Dynamics
+from ._kernels import affine_step
 import numpy as np
 
 
@@ -47,7 +48,7 @@ class Quadrotor(Dynamics):
         return xs + self.dt * self.dynamics(xs, us)
 
     def dynamics(self, xs, us):
-        xdot = (np.dot(self.At, xs.T) + np.dot(self.bt, us.T)).T + self.ct
+        xdot = affine_step(xs, us, self.At, self.bt, self.ct)
         if self.process_noise is not None:
             noise = np.random.uniform(
                 low=self.process_noise[:, 0],
@@ -0,0 +1,44 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional (pip install nn_closed_loop[jit]); without it,
+    # affine_step falls back to the plain numpy expression
+    njit = None
+
+
+def affine_step(xs, us, At, bt, ct):
+    # Computes (At @ xs.T + bt @ us.T).T + ct for a batch of states
+    # (or for a single state, when xs is 1-D). At, bt, ct are already
+    # float64 (Dynamics.__init__ casts them); controls are cast here since
+    # NN controls arrive as float32
+    if _affine_step is None:
+        return (np.dot(At, xs.T) + np.dot(bt, us.T)).T + ct
+    if np.ndim(xs) == 1:
+        return affine_step(
+            np.atleast_2d(xs), np.atleast_2d(us), At, bt, ct
+        )[0]
+    return _affine_step(xs, np.asarray(us, dtype=np.float64), At, bt, ct)
+
+
+def _affine_step_kernel(xs, us, At, bt, ct):
+    # Allocates only the result, which it fills row by row
+    num_runs, num_states = xs.shape
+    num_inputs = us.shape[1]
+    out = np.empty((num_runs, num_states))
+    for r in range(num_runs):
+        for i in range(num_states):
+            acc = ct[i]
+            for j in range(num_states):
+                acc += At[i, j] * xs[r, j]
+            for k in range(num_inputs):
+                acc += bt[i, k] * us[r, k]
+            out[r, i] = acc
+    return out
+
+
+if njit is None:
+    _affine_step = None
+else:
+    _affine_step = njit(cache=True)(_affine_step_kernel)
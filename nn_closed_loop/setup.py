@@ -9,5 +9,6 @@ setup(
         "pandas",
         "nn_partition",
     ],
+    extras_require={"jit": ["numba"]},
     packages=find_packages(),
 )
@@ -7,6 +7,19 @@ from nn_partition.models.models import (
 import argparse
 import os
 
+dir_path = os.path.dirname(os.path.abspath(__file__))
+
+# Hyperparameters embedded in the plot filename, in order
+_PART_KEYS = (
+    "interior_condition",
+    "num_simulations",
+    "show_input",
+    "show_output",
+    "termination_condition_type",
+    "termination_condition_value",
+)
+_PROP_KEYS = ()
+
 
 def main(args):
     # Setup NN
@@ -89,45 +102,26 @@ def main(args):
 
     # Generate a visualization of the input/output mapping
     if args.save_plot:
-        save_dir = "{}/results/examples/".format(
-            os.path.dirname(os.path.abspath(__file__))
-        )
+        save_dir = "{}/results/examples/".format(dir_path)
         os.makedirs(save_dir, exist_ok=True)
 
         # Ugly logic to embed parameters in filename:
         pars = "_".join(
-            [
-                str(key) + "_" + str(value)
-                for key, value in sorted(
-                    partitioner_hyperparams.items(), key=lambda kv: kv[0]
-                )
-                if key not in ["make_animation", "show_animation", "type"]
-            ]
+            f"{key}_{partitioner_hyperparams[key]}"
+            for key in _PART_KEYS
+            if key in partitioner_hyperparams
         )
         pars2 = "_".join(
-            [
-                str(key) + "_" + str(value)
-                for key, value in sorted(
-                    propagator_hyperparams.items(), key=lambda kv: kv[0]
-                )
-                if key not in ["input_shape", "type"]
-            ]
+            f"{key}_{propagator_hyperparams[key]}"
+            for key in _PROP_KEYS
+            if key in propagator_hyperparams
         )
-        model_str = args.model + "_" + args.activation + "_"
+        pars2 = "_" + pars2 if pars2 else ""
         analyzer_info["save_name"] = (
-            save_dir
-            + model_str
-            + partitioner_hyperparams["type"]
-            + "_"
-            + propagator_hyperparams["type"]
-            + "_"
-            + pars
+            f"{save_dir}{args.model}_{args.activation}_"
+            f"{partitioner_hyperparams['type']}_"
+            f"{propagator_hyperparams['type']}_{pars}{pars2}.png"
         )
-        if len(pars2) > 0:
-            analyzer_info["save_name"] = (
-                analyzer_info["save_name"] + "_" + pars2
-            )
-        analyzer_info["save_name"] = analyzer_info["save_name"] + ".png"
 
     if args.save_plot or args.show_plot:
         # Plot shape/label settings